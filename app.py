@@ -5,136 +5,467 @@ A simple Flask REST API for managing KingdomVR user accounts.
 
 import os
 import functools
-from flask import Flask, request, jsonify, abort
+import hashlib
+import hmac
+import itertools
+import threading
+import cachetools
+import orjson
+from flask import Flask, Response, request, jsonify, abort, stream_with_context
+from flask.json.provider import DefaultJSONProvider
 from dotenv import load_dotenv
+from werkzeug.middleware.dispatcher import DispatcherMiddleware
 from werkzeug.security import generate_password_hash, check_password_hash
 
 load_dotenv()
 
 app = Flask(__name__)
-# Admin app (serves a small web UI on port 1212)
-from flask import render_template_string
-import threading
+# Admin app (serves a small web UI, mounted under /admin)
 admin_app = Flask("admin")
 
 # ---------------------------------------------------------------------------
 # Configuration
 # ---------------------------------------------------------------------------
 app.config["DATABASE"] = os.environ.get("DATABASE", "kvr_database.db")
+# Reject oversized bodies with 413 before they are read.  API payloads are a
+# handful of fields; the admin app also accepts batches of users.
+app.config["MAX_CONTENT_LENGTH"] = 4 * 1024
+admin_app.config["MAX_CONTENT_LENGTH"] = 1024 * 1024
 # Trim surrounding whitespace to avoid accidental trailing/leading spaces in .env
 API_KEY = os.environ.get("API_KEY", "").strip()
+# The admin UI is only mounted under /admin when explicitly enabled: it shares
+# the public port, and its first-time password setup needs no credentials.
+ADMIN_ENABLED = os.environ.get("ADMIN_ENABLED", "").strip().lower() in ("1", "true", "yes")
+
+# ---------------------------------------------------------------------------
+# JSON (orjson instead of the stdlib encoder/decoder)
+# ---------------------------------------------------------------------------
+
+
+class OrjsonProvider(DefaultJSONProvider):
+    """Flask JSON provider backed by orjson.
+
+    Keeps Flask's key sorting, debug indentation and handling of dates (as
+    HTTP dates) and dataclasses, but does the encoding in C and writes the
+    response body as bytes directly.  UUIDs are encoded natively, to the same
+    string Flask produces.
+    """
+
+    def _option(self, indent=False):
+        # orjson would encode datetimes (as ISO 8601) and dataclasses itself;
+        # pass them through to Flask's `default` instead.
+        option = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        return orjson.dumps(obj, default=self.default, option=self._option(kwargs.get("indent"))).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        body = orjson.dumps(obj, default=self.default, option=self._option(indent) | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
+
+
+app.json = OrjsonProvider(app)
+admin_app.json = OrjsonProvider(admin_app)
 
 # ---------------------------------------------------------------------------
 # Database helpers (sqlite3 – no ORM needed, easy to extend)
 # ---------------------------------------------------------------------------
 import sqlite3
+import queue
+import contextlib
 
+# Connections are opened once and handed back to this pool at the end of each
+# request, so the page cache and PRAGMA setup survive across requests.  The
+# pool bounds the number of *idle* connections; when it is empty a fresh one
+# is opened, and when it is full the returned connection is simply closed.
+POOL_SIZE = int(os.environ.get("ADMIN_POOL_SIZE", 8))
+_pool = queue.LifoQueue(maxsize=POOL_SIZE)
 
-def get_db():
-    """Open a new database connection for the current request."""
-    conn = sqlite3.connect(app.config["DATABASE"])
-    conn.row_factory = sqlite3.Row
+# sqlite3 keeps a per-connection cache of compiled statements keyed by SQL
+# text.  Hot-path queries are kept as module constants so every request hits
+# that cache instead of re-preparing the statement.
+STATEMENT_CACHE_SIZE = 256
+
+# Columns the public API never returns; every other column of `users`,
+# including ones added by scripts/add_field.py, is part of its responses.
+HIDDEN_USER_COLUMNS = ("id",)
+
+
+def returning_columns(columns, real_columns):
+    """Return a RETURNING list for `columns` that casts REAL ones.
+
+    RETURNING reports values before column affinity is applied, so a REAL
+    column written as 3 comes back as the integer 3, while a later SELECT
+    reads 3.0.  Casting the values SQLite stores as REAL keeps write
+    responses identical to reads; NULLs and non-numeric text pass through.
+    """
+    return ", ".join(
+        f"CASE typeof({c}) WHEN 'real' THEN CAST({c} AS REAL) ELSE {c} END AS {c}"
+        if c in real_columns else c
+        for c in columns
+    )
+
+
+# Filled in with the public column list from get_public_columns(); the text
+# only changes with the schema, so the statement cache still applies.
+SELECT_BY_USERNAME = "SELECT {columns} FROM users WHERE username = ?"
+SELECT_BY_PIN = "SELECT {columns} FROM users WHERE pin = ?"
+INSERT_USER = "INSERT INTO users (username, pin, kvrcoin, chess_points) VALUES (?, ?, ?, ?)"
+DELETE_USER = "DELETE FROM users WHERE username = ?"
+
+# SQLite 3.35+ can hand back the written row from the INSERT/UPDATE itself.
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
+# Per-connection tuning.  Unlike journal_mode (set once in init_db), these
+# settings are not stored in the database file and must be applied to every
+# new connection.
+SESSION_PRAGMAS = (
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -64000",
+    "PRAGMA mmap_size = 268435456",
     # Enable foreign-key enforcement
-    conn.execute("PRAGMA foreign_keys = ON")
+    "PRAGMA foreign_keys = ON",
+)
+
+
+@functools.lru_cache(maxsize=64)
+def update_sql(fields):
+    """Return the UPDATE statement for a sorted tuple of column names.
+
+    Callers must pass the columns in sorted order (and bind values in that
+    order) so each distinct set of fields maps to exactly one SQL string.
+    """
+    set_clause = ", ".join(f"{field} = ?" for field in fields)
+    return f"UPDATE users SET {set_clause} WHERE username = ?"
+
+
+# Fields the public API may change, and the UPDATE for every non-empty subset
+# of them, so a PATCH never builds a new SQL string.  Keys are sorted tuples,
+# matching the order values are bound in, whatever order MUTABLE_FIELDS uses.
+MUTABLE_FIELDS = ("chess_points", "kvrcoin", "pin")
+UPDATE_SQL = {
+    fields: update_sql(fields)
+    for n in range(1, len(MUTABLE_FIELDS) + 1)
+    for fields in itertools.combinations(sorted(MUTABLE_FIELDS), n)
+}
+
+
+def _connect(database):
+    """Open and configure a new connection to `database`."""
+    # isolation_level=None puts the connection in autocommit mode: every
+    # statement commits on its own, so a pooled connection never carries an
+    # open transaction over to the next request. uri=True lets DATABASE be a
+    # "file:" URI (e.g. a shared in-memory database); plain paths still work.
+    conn = sqlite3.connect(
+        database,
+        check_same_thread=False,
+        isolation_level=None,
+        cached_statements=STATEMENT_CACHE_SIZE,
+        uri=True,
+    )
+    conn.row_factory = sqlite3.Row
+    for pragma in SESSION_PRAGMAS:
+        conn.execute(pragma)
     return conn
 
 
-def get_user_columns(conn=None):
-    """Return the list of column names for the `users` table."""
-    close = conn is None
-    if conn is None:
-        conn = get_db()
+def _close(conn):
+    """Close a connection, letting SQLite refresh its query-planner stats first."""
     try:
-        rows = conn.execute("PRAGMA table_info(users)").fetchall()
-        cols = [r[1] for r in rows]
-        return cols
+        conn.execute("PRAGMA optimize")
+    except sqlite3.Error:
+        # Only housekeeping (e.g. its ANALYZE hit the busy timeout); the
+        # request using this connection has already finished.
+        pass
     finally:
-        if close:
-            conn.close()
+        conn.close()
+
+
+@contextlib.contextmanager
+def get_db():
+    """Borrow a pooled database connection for the duration of a `with` block."""
+    database = app.config["DATABASE"]
+    try:
+        path, conn = _pool.get_nowait()
+    except queue.Empty:
+        path, conn = database, _connect(database)
+    else:
+        if path != database:
+            # The configured database changed (e.g. between tests); the
+            # pooled connection points at the old file.
+            _close(conn)
+            path, conn = database, _connect(database)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.rollback()
+        try:
+            _pool.put_nowait((path, conn))
+        except queue.Full:
+            _close(conn)
+
+
+# ((database, schema_version), columns, returning, public columns, public
+# returning) for the last schema seen.
+# SQLite bumps schema_version on every schema change, so columns added by
+# scripts/add_field.py are picked up without restarting the server.
+_user_columns_cache = (None, (), "", "", "")
+
+
+def _load_user_columns(conn):
+    """Return (columns, RETURNING list, public column list, public RETURNING
+    list) for the current `users` schema."""
+    global _user_columns_cache
+    version = conn.execute("PRAGMA schema_version").fetchone()[0]
+    key = (app.config["DATABASE"], version)
+    if _user_columns_cache[0] != key:
+        info = conn.execute("PRAGMA table_info(users)").fetchall()
+        cols = tuple(r[1] for r in info)
+        # SQLite's affinity rules: REAL unless the type names an INT or TEXT type
+        real = {
+            r[1] for r in info
+            if any(t in r[2].upper() for t in ("REAL", "FLOA", "DOUB"))
+            and not any(t in r[2].upper() for t in ("INT", "CHAR", "CLOB", "TEXT"))
+        }
+        public = tuple(c for c in cols if c not in HIDDEN_USER_COLUMNS)
+        _user_columns_cache = (
+            key,
+            cols,
+            returning_columns(cols, real),
+            ", ".join(public),
+            returning_columns(public, real),
+        )
+    return _user_columns_cache[1:]
+
+
+def get_user_columns(conn=None):
+    """Return the column names of the `users` table as a tuple."""
+    if conn is None:
+        with get_db() as conn:
+            return get_user_columns(conn)
+    return _load_user_columns(conn)[0]
+
+
+def get_user_returning(conn):
+    """Return a RETURNING list covering every column of `users`."""
+    return _load_user_columns(conn)[1]
+
+
+def get_public_columns(conn):
+    """Return (SELECT list, RETURNING list) for the columns the API exposes."""
+    return _load_user_columns(conn)[2:]
 
 
 def init_db(conn=None):
     """Create the users table if it does not already exist."""
-    close = conn is None
     if conn is None:
-        conn = get_db()
-    conn.execute(
+        with get_db() as conn:
+            return init_db(conn)
+    # WAL lets readers run concurrently with a writer.  The journal mode is
+    # persisted in the database file, so setting it once here is enough.
+    # WAL needs shared memory between processes: the database file must live
+    # on a local filesystem, not a network share.
+    conn.execute("PRAGMA journal_mode = WAL")
+    for pragma in SESSION_PRAGMAS:
+        conn.execute(pragma)
+    # Create the whole schema in one transaction: a single commit, and a
+    # half-created schema is never left behind.
+    conn.executescript(
         """
+        BEGIN;
         CREATE TABLE IF NOT EXISTS users (
             id          INTEGER PRIMARY KEY AUTOINCREMENT,
             username    TEXT    NOT NULL UNIQUE,
             pin         TEXT    NOT NULL UNIQUE,
             kvrcoin     REAL    NOT NULL DEFAULT 0,
             chess_points REAL   NOT NULL DEFAULT 0
-        )
-        """
-    )
-    conn.commit()
-    # Create admin table to store password hash (single-row table)
-    conn.execute(
-        """
+        );
+        -- Serves /leaderboard/chess straight from the index in either sort
+        -- order; including `username` means the table itself is never read.
+        CREATE INDEX IF NOT EXISTS ix_users_chess_points ON users (chess_points DESC, username);
+        -- Create admin table to store password hash (single-row table)
         CREATE TABLE IF NOT EXISTS admin (
             id INTEGER PRIMARY KEY,
             password_hash TEXT
-        )
+        );
+        COMMIT;
         """
     )
-    conn.commit()
-    if close:
-        conn.close()
+    # Cached lookups may come from a different (or older) database file.
+    invalidate_user_cache()
 
 
 def get_admin_hash(conn=None):
-    close = conn is None
     if conn is None:
-        conn = get_db()
-    try:
-        row = conn.execute("SELECT password_hash FROM admin WHERE id = 1").fetchone()
-        return row[0] if row is not None else None
-    finally:
-        if close:
-            conn.close()
+        with get_db() as conn:
+            return get_admin_hash(conn)
+    row = conn.execute("SELECT password_hash FROM admin WHERE id = 1").fetchone()
+    return row[0] if row is not None else None
 
 
 def set_admin_hash(password_hash, conn=None):
-    close = conn is None
     if conn is None:
-        conn = get_db()
-    try:
-        # Insert or replace single-row (id=1)
-        conn.execute("INSERT OR REPLACE INTO admin (id, password_hash) VALUES (1, ?)", (password_hash,))
-        conn.commit()
-    finally:
-        if close:
-            conn.close()
+        with get_db() as conn:
+            return set_admin_hash(password_hash, conn)
+    # Insert or replace single-row (id=1)
+    conn.execute("INSERT OR REPLACE INTO admin (id, password_hash) VALUES (1, ?)", (password_hash,))
+
+
+def write_user(conn, sql, params, username, columns):
+    """Run an INSERT/UPDATE of a single user and return `columns` of the row.
+
+    `columns` should come from returning_columns(), so REAL values read back
+    the same way a SELECT would return them.
+
+    Returns None when the statement did not touch any row.
+    """
+    if HAS_RETURNING:
+        # fetchall() steps the statement to completion, so the write is
+        # committed before the connection goes back to the pool.
+        rows = conn.execute(f"{sql} RETURNING {columns}", params).fetchall()
+        return rows[0] if rows else None
+    cursor = conn.execute(sql, params)
+    if cursor.rowcount == 0:
+        return None
+    return conn.execute(f"SELECT {columns} FROM users WHERE username = ?", (username,)).fetchone()
 
 
 def user_to_dict(row):
-    """Convert a sqlite3.Row to a plain dict (skipping internal 'id')."""
-    # Include all columns returned by the query except the internal `id`.
-    # This makes the API forward-compatible with new columns added to the
-    # `users` table (e.g. via `scripts/add_field.py`).
-    result = {}
-    for key in row.keys():
-        if key == "id":
-            continue
-        result[key] = row[key]
-    return result
+    """Convert a sqlite3.Row to a plain dict keyed by column name."""
+    return dict(zip(row.keys(), row))
+
+
+# Encoded responses of recent user lookups, keyed by ("u", username) or
+# ("p", pin).  Writes through this process clear the cache; the short TTL
+# bounds staleness for writes made elsewhere (another process, a script).
+_user_cache = cachetools.TTLCache(maxsize=4096, ttl=5)
+_user_cache_lock = threading.Lock()
+_user_cache_generation = 0
+
+
+def invalidate_user_cache():
+    """Drop all cached user lookups; call after any write to `users`.
+
+    The whole cache is cleared because a PATCH may change a user's PIN, and
+    the entry for the old PIN cannot be found without another query.
+    """
+    global _user_cache_generation
+    with _user_cache_lock:
+        _user_cache.clear()
+        _user_cache_generation += 1
+
+
+def fetch_user_json(key, sql, value):
+    """Return the JSON body for the user matched by `sql`, or None.
+
+    Bodies are served from `_user_cache` when possible.  A lookup that races
+    with a write is not cached, so it cannot bring back stale data.
+    """
+    with _user_cache_lock:
+        body = _user_cache.get(key)
+        generation = _user_cache_generation
+    if body is not None:
+        return body
+    with get_db() as conn:
+        columns, _ = get_public_columns(conn)
+        row = conn.execute(sql.format(columns=columns), (value,)).fetchone()
+    if row is None:
+        return None
+    body = jsonify(user_to_dict(row)).get_data()
+    with _user_cache_lock:
+        if generation == _user_cache_generation:
+            _user_cache[key] = body
+    return body
+
+
+def json_body():
+    """Parse the request body as JSON, regardless of its Content-Type.
+
+    The raw body is decoded once with orjson; an empty body (or `null`)
+    gives {} and malformed JSON is rejected with a 400.
+    """
+    raw = request.get_data(cache=False)
+    if not raw:
+        return {}
+    try:
+        return orjson.loads(raw) or {}
+    except orjson.JSONDecodeError:
+        abort(400, description="Request body is not valid JSON.")
+
+
+def cacheable_json(body):
+    """Return an encoded JSON body as a briefly cacheable response.
+
+    Adds a weak ETag and `Cache-Control: private, max-age=2`, and answers a
+    matching `If-None-Match` with an empty 304.
+    """
+    resp = app.response_class(body, mimetype="application/json")
+    resp.set_etag(hashlib.blake2b(body, digest_size=8).hexdigest(), weak=True)
+    resp.cache_control.private = True
+    resp.cache_control.max_age = 2
+    return resp.make_conditional(request)
+
+
+NDJSON_MIMETYPE = "application/x-ndjson"
+
+
+def wants_ndjson():
+    """Return True if the client asked for newline-delimited JSON."""
+    best = request.accept_mimetypes.best_match(("application/json", NDJSON_MIMETYPE))
+    return best == NDJSON_MIMETYPE
+
+
+def stream_ndjson(sql, params=()):
+    """Stream the rows of a query as NDJSON, one object per line.
+
+    Rows are encoded straight off the cursor, so memory use does not grow
+    with the size of the result.  The pooled connection is held until the
+    client has received the last row.
+    """
+    def generate():
+        with get_db() as conn:
+            cursor = conn.execute(sql, params)
+            try:
+                columns = [d[0] for d in cursor.description]
+                for row in cursor:
+                    yield orjson.dumps(dict(zip(columns, row)), option=orjson.OPT_APPEND_NEWLINE)
+            finally:
+                cursor.close()
+
+    return Response(stream_with_context(generate()), mimetype=NDJSON_MIMETYPE)
 
 
 # ---------------------------------------------------------------------------
 # Authentication decorator
 # ---------------------------------------------------------------------------
-def require_api_key(f):
-    @functools.wraps(f)
-    def decorated(*args, **kwargs):
-        if not API_KEY:
-            abort(500, description="API_KEY is not configured on the server.")
-        provided = request.headers.get("X-API-Key", "")
-        if provided != API_KEY:
-            abort(401, description="Invalid or missing API key.")
-        return f(*args, **kwargs)
-    return decorated
+@functools.lru_cache(maxsize=1)
+def _api_key_digest(api_key):
+    """SHA-256 of the configured API key, computed once per key value."""
+    return hashlib.sha256(api_key.encode()).digest()
+
+
+@app.before_request
+def require_api_key():
+    """Authenticate every request to the API app before it is dispatched."""
+    if not API_KEY:
+        abort(500, description="API_KEY is not configured on the server.")
+    # Compare fixed-size digests in constant time so response timing
+    # leaks neither the key's length nor a matching prefix.
+    provided = hashlib.sha256(request.headers.get("X-API-Key", "").encode()).digest()
+    if not hmac.compare_digest(provided, _api_key_digest(API_KEY)):
+        abort(401, description="Invalid or missing API key.")
 
 
 # ---------------------------------------------------------------------------
@@ -142,10 +473,9 @@ def require_api_key(f):
 # ---------------------------------------------------------------------------
 
 @app.route("/users", methods=["POST"])
-@require_api_key
 def create_user():
     """Create a new user."""
-    data = request.get_json(silent=True) or {}
+    data = json_body()
     username = data.get("username")
     pin = data.get("pin")
 
@@ -155,134 +485,104 @@ def create_user():
     kvrcoin = data.get("kvrcoin", 0)
     chess_points = data.get("chess_points", 0)
 
-    conn = get_db()
-    try:
-        conn.execute(
-            "INSERT INTO users (username, pin, kvrcoin, chess_points) VALUES (?, ?, ?, ?)",
-            (username, pin, kvrcoin, chess_points),
-        )
-        conn.commit()
-        row = conn.execute(
-            "SELECT * FROM users WHERE username = ?", (username,)
-        ).fetchone()
-        return jsonify(user_to_dict(row)), 201
-    except sqlite3.IntegrityError as exc:
-        abort(409, description=f"Conflict: {exc}")
-    finally:
-        conn.close()
+    with get_db() as conn:
+        _, returning = get_public_columns(conn)
+        try:
+            row = write_user(conn, INSERT_USER, (username, pin, kvrcoin, chess_points), username, returning)
+        except sqlite3.IntegrityError as exc:
+            abort(409, description=f"Conflict: {exc}")
+    invalidate_user_cache()
+    return jsonify(user_to_dict(row)), 201
 
 
 @app.route("/users/<username>", methods=["GET"])
-@require_api_key
 def get_user_by_username(username):
     """Return a user looked up by username."""
-    conn = get_db()
-    try:
-        row = conn.execute(
-            "SELECT * FROM users WHERE username = ?", (username,)
-        ).fetchone()
-    finally:
-        conn.close()
-    if row is None:
+    body = fetch_user_json(("u", username), SELECT_BY_USERNAME, username)
+    if body is None:
         abort(404, description=f"No user with username '{username}'.")
-    return jsonify(user_to_dict(row))
+    return cacheable_json(body)
 
 
 @app.route("/users/pin/<pin>", methods=["GET"])
-@require_api_key
 def get_user_by_pin(pin):
     """Return a user looked up by PIN (PINs are stored as TEXT)."""
-    conn = get_db()
-    try:
-        row = conn.execute(
-            "SELECT * FROM users WHERE pin = ?", (pin,)
-        ).fetchone()
-    finally:
-        conn.close()
-    if row is None:
+    body = fetch_user_json(("p", pin), SELECT_BY_PIN, pin)
+    if body is None:
         abort(404, description=f"No user with pin '{pin}'.")
-    return jsonify(user_to_dict(row))
+    return cacheable_json(body)
 
 
 @app.route("/leaderboard/chess", methods=["GET"])
-@require_api_key
 def chess_leaderboard():
     """Return users and their `chess_points` for a leaderboard.
 
     Query params:
     - `limit` (int, optional): maximum number of rows to return
     - `order` (asc|desc, default desc): sort order by `chess_points`
+
+    Send `Accept: application/x-ndjson` to receive one JSON object per line,
+    streamed as rows are read, instead of a single JSON array.
     """
     limit = request.args.get("limit", type=int)
     order = (request.args.get("order", "desc") or "desc").lower()
     if order not in ("asc", "desc"):
         order = "desc"
 
-    conn = get_db()
-    try:
-        base_sql = f"SELECT username, chess_points FROM users ORDER BY chess_points {order.upper()}"
-        if limit:
-            rows = conn.execute(base_sql + " LIMIT ?", (limit,)).fetchall()
-        else:
-            rows = conn.execute(base_sql).fetchall()
-    finally:
-        conn.close()
+    sql = f"SELECT username, chess_points FROM users ORDER BY chess_points {order.upper()}"
+    params = ()
+    if limit:
+        sql += " LIMIT ?"
+        params = (limit,)
+
+    if wants_ndjson():
+        return stream_ndjson(sql, params)
+
+    with get_db() as conn:
+        rows = conn.execute(sql, params).fetchall()
 
     result = [
         {"username": r["username"], "chess_points": r["chess_points"]}
         for r in rows
     ]
-    return jsonify(result)
+    return cacheable_json(jsonify(result).get_data())
 
 
 @app.route("/users/<username>", methods=["PATCH"])
-@require_api_key
 def update_user(username):
     """Update one or more fields for an existing user."""
-    data = request.get_json(silent=True) or {}
+    data = json_body()
 
     # Only allow known, mutable fields to be updated
-    allowed_fields = {"pin", "kvrcoin", "chess_points"}
-    updates = {k: v for k, v in data.items() if k in allowed_fields}
+    updates = {k: v for k, v in data.items() if k in MUTABLE_FIELDS}
 
     if not updates:
         abort(400, description="No valid fields provided for update.")
 
-    set_clause = ", ".join(f"{field} = ?" for field in updates)
-    values = list(updates.values()) + [username]
-
-    conn = get_db()
-    try:
-        cursor = conn.execute(
-            f"UPDATE users SET {set_clause} WHERE username = ?", values
-        )
-        conn.commit()
-        if cursor.rowcount == 0:
-            abort(404, description=f"No user with username '{username}'.")
-        row = conn.execute(
-            "SELECT * FROM users WHERE username = ?", (username,)
-        ).fetchone()
-        return jsonify(user_to_dict(row))
-    except sqlite3.IntegrityError as exc:
-        abort(409, description=f"Conflict: {exc}")
-    finally:
-        conn.close()
+    fields = tuple(sorted(updates))
+    sql = UPDATE_SQL[fields]
+    values = [updates[field] for field in fields] + [username]
+
+    with get_db() as conn:
+        _, returning = get_public_columns(conn)
+        try:
+            row = write_user(conn, sql, values, username, returning)
+        except sqlite3.IntegrityError as exc:
+            abort(409, description=f"Conflict: {exc}")
+    invalidate_user_cache()
+    if row is None:
+        abort(404, description=f"No user with username '{username}'.")
+    return jsonify(user_to_dict(row))
 
 
 @app.route("/users/<username>", methods=["DELETE"])
-@require_api_key
 def delete_user(username):
     """Delete a user."""
-    conn = get_db()
-    try:
-        cursor = conn.execute(
-            "DELETE FROM users WHERE username = ?", (username,)
-        )
-        conn.commit()
-        if cursor.rowcount == 0:
-            abort(404, description=f"No user with username '{username}'.")
-    finally:
-        conn.close()
+    with get_db() as conn:
+        cursor = conn.execute(DELETE_USER, (username,))
+    invalidate_user_cache()
+    if cursor.rowcount == 0:
+        abort(404, description=f"No user with username '{username}'.")
     return jsonify({"message": f"User '{username}' deleted."})
 
 
@@ -291,271 +591,322 @@ def delete_user(username):
 # --------------------------
 
 
-@admin_app.route("/")
-def admin_index():
-        html = """
-        <!doctype html>
-        <html>
-        <head>
-            <meta charset="utf-8" />
-            <title>KVR Go Admin</title>
-            <style>body{font-family:sans-serif;padding:20px}table{border-collapse:collapse;width:100%}td,th{border:1px solid #ddd;padding:8px} .hidden{display:none}</style>
-        </head>
-        <body>
-            <h1>KVR Admin</h1>
-            <section id="setPasswordSection" class="hidden">
-                <h2>Set Admin Password</h2>
-                <form id="setPasswordForm">
-                    <input type="password" id="newPass" placeholder="New password" />
-                    <input type="password" id="newPass2" placeholder="Confirm password" />
-                    <button type="submit">Set Password</button>
-                </form>
-            </section>
-
-            <section id="loginSection" class="hidden">
-                <h2>Admin Login</h2>
-                <button id="loginBtn">Enter password</button>
-            </section>
-
-            <section id="adminUI" class="hidden">
-                <section>
-                    <h2>Create user</h2>
-                    <form id="createForm">
-                        <div id="createInputs"></div>
-                        <button type="submit">Create</button>
-                    </form>
-                </section>
-
-                <section>
-                    <h2>Users</h2>
-                    <div id="users"></div>
-                </section>
-            </section>
-
-            <script>
-            let authHeader = null;
-
-            async function fetchJSON(path, opts={}){
-                opts.headers = opts.headers || {};
-                if(authHeader){ opts.headers['Authorization'] = authHeader; }
-                const res = await fetch(path, opts);
-                if(!res.ok){ const txt = await res.text(); throw {status: res.status, text: txt}; }
-                return res.json();
+# The admin page has no per-request content, so it is encoded once and served
+# as-is; the ETag lets browsers revalidate it with a bodiless 304.
+_ADMIN_HTML = """
+<!doctype html>
+<html>
+<head>
+    <meta charset="utf-8" />
+    <title>KVR Go Admin</title>
+    <style>body{font-family:sans-serif;padding:20px}table{border-collapse:collapse;width:100%}td,th{border:1px solid #ddd;padding:8px} .hidden{display:none}</style>
+</head>
+<body>
+    <h1>KVR Admin</h1>
+    <section id="setPasswordSection" class="hidden">
+        <h2>Set Admin Password</h2>
+        <form id="setPasswordForm">
+            <input type="password" id="newPass" placeholder="New password" />
+            <input type="password" id="newPass2" placeholder="Confirm password" />
+            <button type="submit">Set Password</button>
+        </form>
+    </section>
+
+    <section id="loginSection" class="hidden">
+        <h2>Admin Login</h2>
+        <button id="loginBtn">Enter password</button>
+    </section>
+
+    <section id="adminUI" class="hidden">
+        <section>
+            <h2>Create user</h2>
+            <form id="createForm">
+                <div id="createInputs"></div>
+                <button type="submit">Create</button>
+            </form>
+        </section>
+
+        <section>
+            <h2>Users</h2>
+            <div id="users"></div>
+        </section>
+    </section>
+
+    <script>
+    let authHeader = null;
+    // The admin API lives next to this page, wherever the app is mounted.
+    const apiBase = location.pathname.replace(/[/]+$/, '') + '/api';
+
+    async function fetchJSON(path, opts={}){
+        opts.headers = opts.headers || {};
+        if(authHeader){ opts.headers['Authorization'] = authHeader; }
+        const res = await fetch(path, opts);
+        if(!res.ok){ const txt = await res.text(); throw {status: res.status, text: txt}; }
+        return res.json();
+    }
+
+    function show(id){ document.getElementById(id).classList.remove('hidden'); }
+    function hide(id){ document.getElementById(id).classList.add('hidden'); }
+
+    async function promptForPassword(){
+        while(true){
+            const pwd = prompt('Enter admin password (cancel to abort):');
+            if(pwd === null) throw 'cancelled';
+            authHeader = 'Basic ' + btoa('admin:' + pwd);
+            try{
+                const r = await fetch(apiBase + '/fields', {headers: {'Authorization': authHeader}});
+                if(r.status === 200) return;
+                if(r.status === 401){ alert('Invalid password'); continue; }
+                throw 'error';
+            }catch(e){
+                if(e && e.status === 401) { alert('Invalid password'); continue; }
+                throw e;
             }
-
-            function show(id){ document.getElementById(id).classList.remove('hidden'); }
-            function hide(id){ document.getElementById(id).classList.add('hidden'); }
-
-            async function promptForPassword(){
-                while(true){
-                    const pwd = prompt('Enter admin password (cancel to abort):');
-                    if(pwd === null) throw 'cancelled';
-                    authHeader = 'Basic ' + btoa('admin:' + pwd);
-                    try{
-                        const r = await fetch('/api/fields', {headers: {'Authorization': authHeader}});
-                        if(r.status === 200) return;
-                        if(r.status === 401){ alert('Invalid password'); continue; }
-                        throw 'error';
-                    }catch(e){
-                        if(e && e.status === 401) { alert('Invalid password'); continue; }
-                        throw e;
-                    }
+        }
+    }
+
+    async function loadAdminUI(){
+        const fields = await fetchJSON(apiBase + '/fields');
+        const users = await fetchJSON(apiBase + '/users');
+
+        // build create form inputs
+        const createInputs = document.getElementById('createInputs');
+        createInputs.innerHTML = '';
+        for(const f of fields){
+            if(f === 'id') continue;
+            const inp = document.createElement('input'); inp.name = f; inp.placeholder = f; inp.style.marginRight='8px';
+            createInputs.appendChild(inp);
+        }
+
+        // build users table
+        const usersDiv = document.getElementById('users');
+        usersDiv.innerHTML = '';
+        const table = document.createElement('table');
+        const thead = document.createElement('thead');
+        const tr = document.createElement('tr');
+        for(const f of fields){ const th = document.createElement('th'); th.textContent = f; tr.appendChild(th); }
+        tr.appendChild(document.createElement('th'));
+        thead.appendChild(tr); table.appendChild(thead);
+        const tbody = document.createElement('tbody');
+
+        for(const u of users){
+            const row = document.createElement('tr');
+            for(const f of fields){
+                const td = document.createElement('td');
+                if(f === 'id'){
+                    td.textContent = u[f] ?? '';
+                } else if(f === 'username'){
+                    const span = document.createElement('span'); span.textContent = u[f]; td.appendChild(span);
+                } else {
+                    const inp = document.createElement('input'); inp.value = u[f] ?? ''; inp.dataset.field = f; inp.style.width='100%'; td.appendChild(inp);
                 }
+                row.appendChild(td);
             }
-
-            async function loadAdminUI(){
-                const fields = await fetchJSON('/api/fields');
-                const users = await fetchJSON('/api/users');
-
-                // build create form inputs
-                const createInputs = document.getElementById('createInputs');
-                createInputs.innerHTML = '';
-                for(const f of fields){
-                    if(f === 'id') continue;
-                    const inp = document.createElement('input'); inp.name = f; inp.placeholder = f; inp.style.marginRight='8px';
-                    createInputs.appendChild(inp);
-                }
-
-                // build users table
-                const usersDiv = document.getElementById('users');
-                usersDiv.innerHTML = '';
-                const table = document.createElement('table');
-                const thead = document.createElement('thead');
-                const tr = document.createElement('tr');
-                for(const f of fields){ const th = document.createElement('th'); th.textContent = f; tr.appendChild(th); }
-                tr.appendChild(document.createElement('th'));
-                thead.appendChild(tr); table.appendChild(thead);
-                const tbody = document.createElement('tbody');
-
-                for(const u of users){
-                    const row = document.createElement('tr');
-                    for(const f of fields){
-                        const td = document.createElement('td');
-                        if(f === 'id'){
-                            td.textContent = u[f] ?? '';
-                        } else if(f === 'username'){
-                            const span = document.createElement('span'); span.textContent = u[f]; td.appendChild(span);
-                        } else {
-                            const inp = document.createElement('input'); inp.value = u[f] ?? ''; inp.dataset.field = f; inp.style.width='100%'; td.appendChild(inp);
-                        }
-                        row.appendChild(td);
-                    }
-                    const tdActions = document.createElement('td');
-                    const save = document.createElement('button'); save.textContent='Save';
-                    save.onclick = async ()=>{
-                        const updates = {};
-                        for(const inp of row.querySelectorAll('input')){
-                            updates[inp.dataset.field] = isNaN(inp.value) ? inp.value : (inp.value === '' ? null : Number(inp.value));
-                        }
-                        await fetchJSON('/api/users/'+encodeURIComponent(u.username), {method:'PATCH',headers:{'Content-Type':'application/json'},body:JSON.stringify(updates)});
-                        await refresh();
-                    };
-                    const del = document.createElement('button'); del.textContent='Delete'; del.style.marginLeft='8px';
-                    del.onclick = async ()=>{ if(confirm('Delete '+u.username+'?')){ await fetchJSON('/api/users/'+encodeURIComponent(u.username), {method:'DELETE'}); await refresh(); } };
-                    tdActions.appendChild(save); tdActions.appendChild(del); row.appendChild(tdActions);
-                    tbody.appendChild(row);
+            const tdActions = document.createElement('td');
+            const save = document.createElement('button'); save.textContent='Save';
+            save.onclick = async ()=>{
+                const updates = {};
+                for(const inp of row.querySelectorAll('input')){
+                    updates[inp.dataset.field] = isNaN(inp.value) ? inp.value : (inp.value === '' ? null : Number(inp.value));
                 }
-                table.appendChild(tbody); usersDiv.appendChild(table);
-            }
-
-            async function refresh(){ await loadAdminUI(); }
-
-            document.getElementById('createForm').onsubmit = async (ev)=>{
-                ev.preventDefault();
-                const form = ev.target; const data = {};
-                for(const inp of form.querySelectorAll('input')){ if(inp.value !== ''){ const num = Number(inp.value); data[inp.name] = isNaN(num) ? inp.value : num; } }
-                await fetchJSON('/api/users', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify(data)});
-                form.reset(); await refresh();
-            }
-
-            document.getElementById('setPasswordForm').onsubmit = async (ev)=>{
-                ev.preventDefault();
-                const p1 = document.getElementById('newPass').value;
-                const p2 = document.getElementById('newPass2').value;
-                if(p1 !== p2){ alert('Passwords do not match'); return; }
-                if(p1.length < 4){ alert('Password too short'); return; }
-                await fetch('/api/admin/set', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify({password: p1})});
-                authHeader = 'Basic ' + btoa('admin:' + p1);
-                hide('setPasswordSection'); show('adminUI'); await refresh();
-            }
+                await fetchJSON(apiBase + '/users/'+encodeURIComponent(u.username), {method:'PATCH',headers:{'Content-Type':'application/json'},body:JSON.stringify(updates)});
+                await refresh();
+            };
+            const del = document.createElement('button'); del.textContent='Delete'; del.style.marginLeft='8px';
+            del.onclick = async ()=>{ if(confirm('Delete '+u.username+'?')){ await fetchJSON(apiBase + '/users/'+encodeURIComponent(u.username), {method:'DELETE'}); await refresh(); } };
+            tdActions.appendChild(save); tdActions.appendChild(del); row.appendChild(tdActions);
+            tbody.appendChild(row);
+        }
+        table.appendChild(tbody); usersDiv.appendChild(table);
+    }
+
+    async function refresh(){ await loadAdminUI(); }
+
+    document.getElementById('createForm').onsubmit = async (ev)=>{
+        ev.preventDefault();
+        const form = ev.target; const data = {};
+        for(const inp of form.querySelectorAll('input')){ if(inp.value !== ''){ const num = Number(inp.value); data[inp.name] = isNaN(num) ? inp.value : num; } }
+        await fetchJSON(apiBase + '/users', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify(data)});
+        form.reset(); await refresh();
+    }
+
+    document.getElementById('setPasswordForm').onsubmit = async (ev)=>{
+        ev.preventDefault();
+        const p1 = document.getElementById('newPass').value;
+        const p2 = document.getElementById('newPass2').value;
+        if(p1 !== p2){ alert('Passwords do not match'); return; }
+        if(p1.length < 4){ alert('Password too short'); return; }
+        await fetch(apiBase + '/admin/set', {method:'POST', headers:{'Content-Type':'application/json'}, body:JSON.stringify({password: p1})});
+        authHeader = 'Basic ' + btoa('admin:' + p1);
+        hide('setPasswordSection'); show('adminUI'); await refresh();
+    }
+
+    document.getElementById('loginBtn').onclick = async ()=>{
+        try{ await promptForPassword(); hide('loginSection'); show('adminUI'); await refresh(); }catch(e){ alert('Login cancelled'); }
+    }
+
+    async function init(){
+        try{
+            const s = await fetchJSON(apiBase + '/admin/status');
+            if(!s.has_password){ show('setPasswordSection'); }
+            else { show('loginSection'); }
+        }catch(e){ alert('Error initializing admin UI'); }
+    }
+
+    init();
+    </script>
+</body>
+</html>
+""".encode("utf-8")
+_ADMIN_ETAG = hashlib.md5(_ADMIN_HTML).hexdigest()
 
-            document.getElementById('loginBtn').onclick = async ()=>{
-                try{ await promptForPassword(); hide('loginSection'); show('adminUI'); await refresh(); }catch(e){ alert('Login cancelled'); }
-            }
-
-            async function init(){
-                try{
-                    const s = await fetchJSON('/api/admin/status');
-                    if(!s.has_password){ show('setPasswordSection'); }
-                    else { show('loginSection'); }
-                }catch(e){ alert('Error initializing admin UI'); }
-            }
 
-            init();
-            </script>
-        </body>
-        </html>
-        """
-        return render_template_string(html)
+@admin_app.route("/")
+def admin_index():
+    resp = Response(_ADMIN_HTML, mimetype="text/html", headers={"Cache-Control": "public, max-age=3600"})
+    resp.set_etag(_ADMIN_ETAG)
+    return resp.make_conditional(request)
 
 
 @admin_app.route('/api/fields', methods=['GET'])
 def admin_fields():
     if not _admin_is_authorized():
         return _unauthorized()
-    conn = get_db()
-    try:
+    with get_db() as conn:
         cols = get_user_columns(conn)
-        return jsonify(cols)
-    finally:
-        conn.close()
+    return jsonify(cols)
 
 
 @admin_app.route('/api/users', methods=['GET'])
 def admin_list_users():
     if not _admin_is_authorized():
         return _unauthorized()
-    conn = get_db()
-    try:
-        rows = conn.execute('SELECT * FROM users').fetchall()
-        result = [ {k: row[k] for k in row.keys()} for row in rows ]
-        return jsonify(result)
-    finally:
-        conn.close()
+    if wants_ndjson():
+        return stream_ndjson('SELECT * FROM users')
+    with get_db() as conn:
+        cols = get_user_columns(conn)
+        cur = conn.execute(f"SELECT {', '.join(cols)} FROM users")
+        # plain tuples: the column names are already known
+        cur.row_factory = None
+        rows = cur.fetchall()
+    result = [dict(zip(cols, row)) for row in rows]
+    return jsonify(result)
+
+
+def _admin_insert_sql(cols, data):
+    # Build the INSERT for one user; accept arbitrary other fields present
+    # in the table
+    insert_cols = ['username', 'pin']
+    values = [data['username'], data['pin']]
+    for c in cols:
+        if c in ('id', 'username', 'pin'):
+            continue
+        if c in data:
+            insert_cols.append(c)
+            values.append(data[c])
+    q = f"INSERT INTO users ({', '.join(insert_cols)}) VALUES ({', '.join(['?']*len(values))})"
+    return q, tuple(values)
 
 
 @admin_app.route('/api/users', methods=['POST'])
 def admin_create_user():
     if not _admin_is_authorized():
         return _unauthorized()
-    data = request.get_json(silent=True) or {}
+    data = json_body()
+    if isinstance(data, list):
+        return _admin_create_users(data)
     username = data.get('username')
     pin = data.get('pin')
     if not username or pin is None:
         abort(400, description="'username' and 'pin' are required.")
-    conn = get_db()
-    try:
-        # accept arbitrary other fields present in the table
+    with get_db() as conn:
+        q, values = _admin_insert_sql(get_user_columns(conn), data)
+        try:
+            row = write_user(conn, q, values, username, columns=get_user_returning(conn))
+        except sqlite3.IntegrityError as exc:
+            abort(409, description=str(exc))
+    invalidate_user_cache()
+    return jsonify({k: row[k] for k in row.keys()}), 201
+
+
+# Usernames per `IN (...)` lookup, well below SQLite's bound-parameter limit.
+_ADMIN_BATCH_SELECT_SIZE = 500
+
+
+def _admin_create_users(items):
+    # Insert a JSON array of users in a single transaction, so the whole
+    # batch costs one commit; any conflict rolls back every row.
+    if not items:
+        abort(400, description='No users provided')
+    for d in items:
+        if not isinstance(d, dict) or not d.get('username') or d.get('pin') is None:
+            abort(400, description="Every user needs a 'username' and 'pin'.")
+    with get_db() as conn:
         cols = get_user_columns(conn)
-        insert_cols = ['username', 'pin']
-        values = [username, pin]
-        for c in cols:
-            if c in ('id', 'username', 'pin'):
-                continue
-            if c in data:
-                insert_cols.append(c)
-                values.append(data[c])
-        q = f"INSERT INTO users ({', '.join(insert_cols)}) VALUES ({', '.join(['?']*len(values))})"
-        conn.execute(q, tuple(values))
-        conn.commit()
-        row = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        return jsonify({k: row[k] for k in row.keys()}), 201
-    except sqlite3.IntegrityError as exc:
-        abort(409, description=str(exc))
-    finally:
-        conn.close()
+        # Consecutive users supplying the same set of fields share one
+        # executemany(); runs are not merged across the list, so rows are
+        # inserted (and get ids) in the order they were submitted.
+        statements = [_admin_insert_sql(cols, d) for d in items]
+        batches = [
+            (q, [values for _, values in run])
+            for q, run in itertools.groupby(statements, key=lambda s: s[0])
+        ]
+        # A savepoint rather than BEGIN: on an autocommit connection it opens
+        # (and RELEASE commits) the transaction, and it also nests inside a
+        # transaction that is already open.
+        conn.execute('SAVEPOINT batch')
+        try:
+            for q, rows in batches:
+                conn.executemany(q, rows)
+        except sqlite3.IntegrityError as exc:
+            conn.execute('ROLLBACK TO batch')
+            conn.execute('RELEASE batch')
+            abort(409, description=str(exc))
+        conn.execute('RELEASE batch')
+        usernames = [d['username'] for d in items]
+        rows = []
+        for i in range(0, len(usernames), _ADMIN_BATCH_SELECT_SIZE):
+            chunk = usernames[i:i + _ADMIN_BATCH_SELECT_SIZE]
+            q = f"SELECT * FROM users WHERE username IN ({', '.join(['?']*len(chunk))}) ORDER BY id"
+            rows.extend(conn.execute(q, chunk).fetchall())
+    invalidate_user_cache()
+    return jsonify([{k: row[k] for k in row.keys()} for row in rows]), 201
 
 
 @admin_app.route('/api/users/<username>', methods=['PATCH'])
 def admin_update_user(username):
     if not _admin_is_authorized():
         return _unauthorized()
-    data = request.get_json(silent=True) or {}
+    data = json_body()
     if not data:
         abort(400, description='No data provided')
-    conn = get_db()
-    try:
+    with get_db() as conn:
         cols = get_user_columns(conn)
         updates = {k: v for k, v in data.items() if k in cols and k != 'id' and k != 'username'}
         if not updates:
             abort(400, description='No valid fields to update')
-        set_clause = ', '.join(f"{k} = ?" for k in updates)
-        values = list(updates.values()) + [username]
-        cur = conn.execute(f"UPDATE users SET {set_clause} WHERE username = ?", values)
-        conn.commit()
-        if cur.rowcount == 0:
-            abort(404, description=f"No user with username '{username}'.")
-        row = conn.execute('SELECT * FROM users WHERE username = ?', (username,)).fetchone()
-        return jsonify({k: row[k] for k in row.keys()})
-    except sqlite3.IntegrityError as exc:
-        abort(409, description=str(exc))
-    finally:
-        conn.close()
+        fields = tuple(sorted(updates))
+        values = [updates[k] for k in fields] + [username]
+        try:
+            row = write_user(conn, update_sql(fields), values, username, columns=get_user_returning(conn))
+        except sqlite3.IntegrityError as exc:
+            abort(409, description=str(exc))
+    invalidate_user_cache()
+    if row is None:
+        abort(404, description=f"No user with username '{username}'.")
+    return jsonify({k: row[k] for k in row.keys()})
 
 
 @admin_app.route('/api/users/<username>', methods=['DELETE'])
 def admin_delete_user(username):
     if not _admin_is_authorized():
         return _unauthorized()
-    conn = get_db()
-    try:
-        cur = conn.execute('DELETE FROM users WHERE username = ?', (username,))
-        conn.commit()
-        if cur.rowcount == 0:
-            abort(404, description=f"No user with username '{username}'.")
-        return jsonify({'message': 'deleted'})
-    finally:
-        conn.close()
+    with get_db() as conn:
+        cur = conn.execute(DELETE_USER, (username,))
+    invalidate_user_cache()
+    if cur.rowcount == 0:
+        abort(404, description=f"No user with username '{username}'.")
+    return jsonify({'message': 'deleted'})
 
 
 
@@ -563,6 +914,18 @@ def admin_delete_user(username):
 # Admin password management + helpers
 # --------------------------
 
+# The admin UI is served on the public port under /admin, so the password
+# gets werkzeug's full-strength default; older pbkdf2 hashes still verify.
+ADMIN_HASH_METHOD = "scrypt"
+
+# Recently verified admin credentials.  The admin UI sends Basic auth with
+# every API call; remembering successful checks for a couple of minutes
+# covers a burst of UI activity without running the slow hash on each one.
+# Keys include the stored hash, so changing the password invalidates them,
+# and only a digest of the password is kept.
+_admin_auth_cache = cachetools.TTLCache(maxsize=32, ttl=120)
+_admin_auth_lock = threading.Lock()
+
 
 def _unauthorized():
     # For XHR/fetch requests we don't want the browser to show the native
@@ -579,7 +942,16 @@ def _admin_is_authorized():
     stored = get_admin_hash()
     if not stored:
         return False
-    return check_password_hash(stored, auth.password)
+    key = hashlib.sha256(f"{stored}\0{auth.password}".encode()).digest()
+    with _admin_auth_lock:
+        if key in _admin_auth_cache:
+            return True
+    # Failed attempts are never cached, so guessing stays slow.
+    if not check_password_hash(stored, auth.password):
+        return False
+    with _admin_auth_lock:
+        _admin_auth_cache[key] = True
+    return True
 
 
 @admin_app.route('/api/admin/status', methods=['GET'])
@@ -596,11 +968,11 @@ def admin_set():
     if stored:
         if not _admin_is_authorized():
             return _unauthorized()
-    data = request.get_json(silent=True) or {}
+    data = json_body()
     pwd = data.get('password')
     if not pwd or not isinstance(pwd, str) or len(pwd) < 4:
         abort(400, description='Password must be provided and be at least 4 characters')
-    h = generate_password_hash(pwd)
+    h = generate_password_hash(pwd, method=ADMIN_HASH_METHOD)
     set_admin_hash(h)
     return jsonify({'message': 'admin password set'})
 
@@ -614,6 +986,7 @@ def admin_set():
 @app.errorhandler(401)
 @app.errorhandler(404)
 @app.errorhandler(409)
+@app.errorhandler(413)
 @app.errorhandler(500)
 def handle_error(exc):
     return jsonify({"error": exc.description}), exc.code
@@ -623,14 +996,22 @@ def handle_error(exc):
 # Entry point
 # ---------------------------------------------------------------------------
 
+
+def make_application(admin_enabled=ADMIN_ENABLED):
+    """Return the WSGI application: the API, plus the admin UI under /admin
+    when `admin_enabled`, sharing one server, one set of worker threads and
+    one connection pool."""
+    if not admin_enabled:
+        return app
+    return DispatcherMiddleware(app, {"/admin": admin_app})
+
+
+application = make_application()
+
 if __name__ == "__main__":
+    from waitress import serve
+
     with app.app_context():
         init_db()
-    # start the admin UI on port 1212 in a background thread
-    def _run_admin():
-        admin_app.run(debug=False, host="0.0.0.0", port=int(os.environ.get("ADMIN_PORT", 1212)))
-
-    t = threading.Thread(target=_run_admin, daemon=True)
-    t.start()
-
-    app.run(debug=False, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)))
+    # SQLite has a single writer, so scale with threads rather than processes.
+    serve(application, host="0.0.0.0", port=int(os.environ.get("PORT", 5000)), threads=int(os.environ.get("WSGI_THREADS", 16)))
@@ -5,68 +5,141 @@ Usage examples:
   python scripts/add_field.py --db kvr_database.db
   python scripts/add_field.py --name new_field --default 0 --db kvr_database.db
 
-This script is safe against invalid column names and will update existing rows
-to the provided default value after adding the column.
+This script is safe against invalid column names; existing rows take the
+provided default value from the new column's DEFAULT clause.
 """
 
 import argparse
+import math
 import os
 import re
-import sqlite3
 import sys
 
 
-IDENT_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+# Column names are interpolated unquoted into the server's SQL, so SQLite's
+# keywords are not allowed as names.
+SQLITE_KEYWORDS = frozenset("""
+    ABORT ACTION ADD AFTER ALL ALTER ALWAYS ANALYZE AND AS ASC ATTACH
+    AUTOINCREMENT BEFORE BEGIN BETWEEN BY CASCADE CASE CAST CHECK COLLATE
+    COLUMN COMMIT CONFLICT CONSTRAINT CREATE CROSS CURRENT CURRENT_DATE
+    CURRENT_TIME CURRENT_TIMESTAMP DATABASE DEFAULT DEFERRABLE DEFERRED DELETE
+    DESC DETACH DISTINCT DO DROP EACH ELSE END ESCAPE EXCEPT EXCLUDE EXCLUSIVE
+    EXISTS EXPLAIN FAIL FILTER FIRST FOLLOWING FOR FOREIGN FROM FULL GENERATED
+    GLOB GROUP GROUPS HAVING IF IGNORE IMMEDIATE IN INDEX INDEXED INITIALLY
+    INNER INSERT INSTEAD INTERSECT INTO IS ISNULL JOIN KEY LAST LEFT LIKE LIMIT
+    MATCH MATERIALIZED NATURAL NO NOT NOTHING NOTNULL NULL NULLS OF OFFSET ON
+    OR ORDER OTHERS OUTER OVER PARTITION PLAN PRAGMA PRECEDING PRIMARY QUERY
+    RAISE RANGE RECURSIVE REFERENCES REGEXP REINDEX RELEASE RENAME REPLACE
+    RESTRICT RETURNING RIGHT ROLLBACK ROW ROWS SAVEPOINT SELECT SET TABLE TEMP
+    TEMPORARY THEN TIES TO TRANSACTION TRIGGER UNBOUNDED UNION UNIQUE UPDATE
+    USING VACUUM VALUES VIEW VIRTUAL WHEN WHERE WINDOW WITH WITHOUT
+""".split())
+INT_RE = re.compile(r"^[+-]?\d+$")
+FLOAT_RE = re.compile(r"^[+-]?(\d+\.\d*|\.\d+|\d+)([eE][+-]?\d+)?$")
+INT64_MIN, INT64_MAX = -(2**63), 2**63 - 1
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -65536",
+    "PRAGMA mmap_size = 268435456",
+)
 
 
 def infer_type(value: str):
-    try:
-        int(value)
+    if INT_RE.match(value):
         return "INTEGER"
-    except Exception:
-        pass
-    try:
-        float(value)
+    if FLOAT_RE.match(value):
         return "REAL"
-    except Exception:
-        pass
     return "TEXT"
 
 
-def format_default_literal(value: str, col_type: str):
-    if col_type == "TEXT":
-        return "'" + value.replace("'", "''") + "'"
-    return value
+def is_valid_column_name(name: str):
+    # ASCII letters, digits and underscores, not starting with a digit
+    return name.isascii() and name.isidentifier() and name.upper() not in SQLITE_KEYWORDS
 
 
 def parse_typed_value(value: str, col_type: str):
+    # Raises ValueError for anything SQLite can't store as that type: integers
+    # outside 64 bits don't bind, and quote() renders inf/nan as bare words.
     if col_type == "INTEGER":
-        return int(value)
+        number = int(value)
+        if not INT64_MIN <= number <= INT64_MAX:
+            raise ValueError(f"{value!r} is out of range")
+        return number
     if col_type == "REAL":
-        return float(value)
+        number = float(value)
+        if not math.isfinite(number):
+            raise ValueError(f"{value!r} is not finite")
+        return number
     return value
 
 
-def main():
+def quote_identifier(name: str):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def add_columns(conn, columns):
+    """Add each (name, col_type, default, not_null) column to users.
+
+    All ALTERs run in a single transaction, so adding several columns costs
+    one commit rather than one per column.
+    """
+    cur = conn.cursor()
+    cur.execute("BEGIN")
+    try:
+        for name, col_type, default, not_null in columns:
+            # SQLite itself renders the default as a SQL literal
+            default_literal = cur.execute("SELECT quote(?)", (default,)).fetchone()[0]
+            nullable_sql = "NOT NULL" if not_null else ""
+            # SQLite fills existing rows from the DEFAULT literal, so no
+            # follow-up UPDATE is needed.  This only changes the stored
+            # schema and never rewrites rows, even with NOT NULL, so it
+            # stays constant-time on large tables; copying into a rebuilt
+            # table would be far slower.
+            cur.execute(f"ALTER TABLE users ADD COLUMN {quote_identifier(name)} {col_type} {nullable_sql} DEFAULT {default_literal}")
+    except BaseException:
+        # Some errors (SQLITE_FULL, I/O errors) make SQLite roll back on its
+        # own; a second ROLLBACK would then fail and hide the real error.
+        if conn.in_transaction:
+            cur.execute("ROLLBACK")
+        raise
+    cur.execute("COMMIT")
+
+
+def _make_parser():
     p = argparse.ArgumentParser(description="Add a column to the users table.")
-    p.add_argument("--db", help="Path to sqlite database", default=os.environ.get("DATABASE", "kvr_database.db"))
+    p.add_argument("--db", help="Path to sqlite database (default: $DATABASE or kvr_database.db)")
     p.add_argument("--name", help="Column name to add (identifier)")
     p.add_argument("--default", help="Default value to initialize existing rows with")
     p.add_argument("--type", choices=["INTEGER", "REAL", "TEXT"], help="Optional column type (inferred by default)")
     p.add_argument("--not-null", action="store_true", help="Make column NOT NULL (requires a default)")
-    args = p.parse_args()
+    return p
+
 
-    db = args.db
+# Built once, so callers that run main() repeatedly don't rebuild it
+_PARSER = _make_parser()
+
+
+def main(argv=None):
+    args = _PARSER.parse_args(argv)
+
+    # Read at call time rather than when the parser is built
+    db = args.db or os.environ.get("DATABASE", "kvr_database.db")
     if not os.path.exists(db):
         print(f"Database file not found: {db}")
         sys.exit(2)
 
+    # Imported here so `--help` and argument errors don't pay for loading it
+    import sqlite3
+
     name = args.name or input("New column name: ").strip()
     if not name:
         print("Column name is required.")
         sys.exit(2)
-    if not IDENT_RE.match(name):
-        print("Invalid column name. Use letters, digits and underscores, not starting with a digit.")
+    if not is_valid_column_name(name):
+        print("Invalid column name. Use letters, digits and underscores, not starting with a digit, and not an SQL keyword.")
         sys.exit(2)
 
     default = args.default
@@ -79,15 +152,26 @@ def main():
         # If user entered empty and we inferred numeric, treat as 0
         default = "0"
 
-    default_literal = format_default_literal(default, col_type)
+    try:
+        typed_default = parse_typed_value(default, col_type)
+    except ValueError:
+        print(f"Default value {default!r} is not a valid {col_type}.")
+        sys.exit(2)
 
     not_null = args.not_null
     if not_null and default is None:
         print("Cannot set NOT NULL without a default value.")
         sys.exit(2)
 
-    conn = sqlite3.connect(db)
+    # Autocommit mode: add_columns() issues BEGIN/COMMIT itself, and the
+    # sqlite3 module never opens a transaction implicitly.
+    conn = sqlite3.connect(db, isolation_level=None)
     try:
+        # Match the server's settings. journal_mode=WAL is stored in the
+        # database file, and the server switches to it anyway, so it is not
+        # restored afterwards.
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
         cur = conn.cursor()
 
         # Ensure users table exists
@@ -96,24 +180,16 @@ def main():
             print("No 'users' table found in the database.")
             sys.exit(2)
 
-        # Check if column already exists
-        cur.execute("PRAGMA table_info(users)")
-        cols = [r[1] for r in cur.fetchall()]
-        if name in cols:
+        # The ALTER itself reports an existing column, so no separate
+        # table_info lookup is needed.
+        try:
+            add_columns(conn, [(name, col_type, typed_default, not_null)])
+        except sqlite3.OperationalError as exc:
+            if "duplicate column" not in str(exc):
+                raise
             print(f"Column '{name}' already exists in users table.")
             sys.exit(0)
 
-        # Build and run ALTER TABLE
-        nullable_sql = "NOT NULL" if not_null else ""
-        alter_sql = f"ALTER TABLE users ADD COLUMN {name} {col_type} {nullable_sql} DEFAULT {default_literal}"
-        cur.execute(alter_sql)
-        conn.commit()
-
-        # Ensure existing rows have the desired value (safest approach)
-        typed_val = parse_typed_value(default, col_type)
-        cur.execute(f"UPDATE users SET {name} = ? WHERE {name} IS NULL", (typed_val,))
-        conn.commit()
-
         print(f"Added column '{name}' ({col_type}) with default {default!r} to users table.")
     finally:
         conn.close()
@@ -0,0 +1,82 @@
+"""Tests for scripts/add_field.py."""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+
+# Ensure the project root and scripts/ are on the path
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "scripts"))
+
+import add_field
+from app import init_db
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    """A server database holding one existing user."""
+    path = str(tmp_path / "kvr.db")
+    conn = sqlite3.connect(path, isolation_level=None)
+    init_db(conn)
+    conn.execute("INSERT INTO users (username, pin) VALUES ('alice', '1234')")
+    conn.close()
+    return path
+
+
+def read_column(path, name):
+    """Return (value, typeof(value)) of `name` for the existing user."""
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT "{name}", typeof("{name}") FROM users').fetchone()
+    finally:
+        conn.close()
+
+
+def user_columns(path):
+    conn = sqlite3.connect(path)
+    try:
+        return [r[1] for r in conn.execute("PRAGMA table_info(users)")]
+    finally:
+        conn.close()
+
+
+def test_text_default_with_quote(db_path):
+    add_field.main(["--db", db_path, "--name", "motto", "--default", "it's"])
+    assert read_column(db_path, "motto") == ("it's", "text")
+
+
+def test_real_type_with_integer_default(db_path):
+    add_field.main(["--db", db_path, "--name", "rating", "--type", "REAL", "--default", "5", "--not-null"])
+    assert read_column(db_path, "rating") == (5.0, "real")
+
+
+@pytest.mark.parametrize(
+    "args",
+    [
+        ["--name", "big", "--default", "1e999"],
+        ["--name", "big", "--default", str(2**63)],
+        ["--name", "order", "--default", "0"],
+    ],
+    ids=["infinite-real", "int-overflow", "keyword-name"],
+)
+def test_rejected_input_exits_2_and_leaves_schema(db_path, args):
+    before = user_columns(db_path)
+    with pytest.raises(SystemExit) as exc:
+        add_field.main(["--db", db_path, *args])
+    assert exc.value.code == 2
+    assert user_columns(db_path) == before
+
+
+@pytest.mark.parametrize("second_name", ["level", "LEVEL"])
+def test_existing_column_exits_0_and_leaves_schema(db_path, second_name, capsys):
+    add_field.main(["--db", db_path, "--name", "level", "--default", "1"])
+    before = user_columns(db_path)
+    with pytest.raises(SystemExit) as exc:
+        add_field.main(["--db", db_path, "--name", second_name, "--default", "2", "--type", "TEXT"])
+    assert exc.value.code == 0
+    assert "already exists" in capsys.readouterr().out
+    assert user_columns(db_path) == before
+    assert read_column(db_path, "level") == (1, "integer")
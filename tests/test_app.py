@@ -1,8 +1,16 @@
 """Tests for the KVR Database Server."""
 
+import contextlib
+import datetime
+import json
 import pytest
+import sqlite3
 import sys
 import os
+import uuid
+
+from werkzeug.security import generate_password_hash
+from werkzeug.test import Client
 
 # Ensure the project root is on the path
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
@@ -13,34 +21,94 @@ from app import app, init_db
 
 TEST_API_KEY = "test-secret-key"
 HEADERS = {"X-API-Key": TEST_API_KEY}
+ADMIN_AUTH = ("admin", "test-admin-password")
 
+SEED_USER = "INSERT INTO users (username, pin, kvrcoin, chess_points) VALUES (?, ?, ?, ?)"
 
-@pytest.fixture
-def client(tmp_path):
-    """Create a test client backed by a fresh in-memory-style temp database."""
-    db_path = str(tmp_path / "test.db")
+
+def seed_user(conn, username, pin, kvrcoin=0, chess_points=0):
+    """Insert a user directly, for tests that don't exercise POST /users."""
+    conn.execute(SEED_USER, (username, pin, kvrcoin, chess_points))
+
+
+@pytest.fixture(scope="session")
+def db():
+    """One connection to an in-memory test database whose schema is built once.
+
+    The database is named and shared, so anything that opens
+    app.config["DATABASE"] sees the same data; it is freed when the last
+    connection to it closes.
+    """
+    path = f"file:kvrtest-{uuid.uuid4().hex}?mode=memory&cache=shared"
+    conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False, uri=True)
+    conn.row_factory = sqlite3.Row
+    init_db(conn)
+    app.config["DATABASE"] = path
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def api_client():
+    """One test client shared by every test in this module."""
     app.config["TESTING"] = True
-    app.config["DATABASE"] = db_path
     server.API_KEY = TEST_API_KEY
+    return app.test_client()
+
+
+@pytest.fixture
+def client(api_client, db, monkeypatch):
+    """The shared test client; everything a test writes is rolled back."""
+    @contextlib.contextmanager
+    def get_db():
+        yield db
+
+    # Route handlers use the session connection, inside a savepoint that is
+    # rolled back when the test ends.
+    monkeypatch.setattr(server, "get_db", get_db)
+    server.invalidate_user_cache()
+    db.execute("SAVEPOINT test")
+    yield api_client
+    db.execute("ROLLBACK TO test")
+    db.execute("RELEASE test")
+
+
+@pytest.fixture
+def pool_db(tmp_path, monkeypatch):
+    """Point the app's real connection pool at a fresh on-disk database."""
+    monkeypatch.setitem(app.config, "DATABASE", f"file:{tmp_path / 'pool.db'}")
+    init_db()
+    return app.config["DATABASE"]
 
-    with app.app_context():
-        init_db()
 
-    with app.test_client() as c:
-        yield c
+@pytest.fixture
+def admin_client(client, db):
+    """A client for the combined API + /admin application, with an admin
+    password set; like `client`, everything it writes is rolled back."""
+    server.set_admin_hash(generate_password_hash(ADMIN_AUTH[1], method=server.ADMIN_HASH_METHOD), db)
+    return Client(server.make_application(admin_enabled=True))
 
 
 # ---------------------------------------------------------------------------
-# Authentication
+# JSON
 # ---------------------------------------------------------------------------
 
-def test_missing_api_key_returns_401(client):
-    resp = client.get("/users/alice")
-    assert resp.status_code == 401
+def test_json_provider_keeps_flask_date_format():
+    assert app.json.dumps({"d": datetime.datetime(2020, 1, 1)}) == '{"d":"Wed, 01 Jan 2020 00:00:00 GMT"}'
+
 
+# ---------------------------------------------------------------------------
+# Authentication
+# ---------------------------------------------------------------------------
 
-def test_wrong_api_key_returns_401(client):
-    resp = client.get("/users/alice", headers={"X-API-Key": "wrong"})
+# Rejected before any database access, so no per-test database is needed.
+@pytest.mark.parametrize(
+    "headers",
+    [{}, {"X-API-Key": "wrong"}],
+    ids=["missing", "wrong"],
+)
+def test_bad_api_key_returns_401(api_client, headers):
+    resp = api_client.get("/users/alice", headers=headers)
     assert resp.status_code == 401
 
 
@@ -84,6 +152,26 @@ def test_create_user_missing_pin_returns_400(client):
     assert resp.status_code == 400
 
 
+def test_create_user_invalid_json_returns_400(client):
+    resp = client.post(
+        "/users",
+        data="{not json",
+        headers={**HEADERS, "Content-Type": "application/json"},
+    )
+    assert resp.status_code == 400
+    assert "not valid JSON" in resp.get_json()["error"]
+
+
+def test_create_user_oversized_body_returns_413(client):
+    resp = client.post(
+        "/users",
+        json={"username": "alice", "pin": 1234, "junk": "x" * 8192},
+        headers=HEADERS,
+    )
+    assert resp.status_code == 413
+    assert "error" in resp.get_json()
+
+
 def test_create_user_duplicate_username_returns_409(client):
     client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
     resp = client.post("/users", json={"username": "alice", "pin": 9999}, headers=HEADERS)
@@ -100,8 +188,8 @@ def test_create_user_duplicate_pin_returns_409(client):
 # Get by username
 # ---------------------------------------------------------------------------
 
-def test_get_user_by_username(client):
-    client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
+def test_get_user_by_username(client, db):
+    seed_user(db, "alice", 1234)
     resp = client.get("/users/alice", headers=HEADERS)
     assert resp.status_code == 200
     assert resp.get_json()["username"] == "alice"
@@ -112,12 +200,51 @@ def test_get_nonexistent_user_returns_404(client):
     assert resp.status_code == 404
 
 
+def test_get_user_reflects_later_update(client, db):
+    seed_user(db, "alice", "1234")
+    assert client.get("/users/alice", headers=HEADERS).get_json()["kvrcoin"] == 0
+    assert client.get("/users/pin/1234", headers=HEADERS).status_code == 200
+    client.patch("/users/alice", json={"kvrcoin": 5, "pin": "4321"}, headers=HEADERS)
+    assert client.get("/users/alice", headers=HEADERS).get_json()["kvrcoin"] == 5
+    assert client.get("/users/pin/1234", headers=HEADERS).status_code == 404
+
+
+def test_write_responses_match_following_get(client):
+    created = client.post("/users", json={"username": "alice", "pin": "1234"}, headers=HEADERS)
+    assert created.data == client.get("/users/alice", headers=HEADERS).data
+    updated = client.patch("/users/alice", json={"kvrcoin": 3}, headers=HEADERS)
+    resp = client.get("/users/alice", headers=HEADERS)
+    assert updated.data == resp.data
+    assert resp.get_json()["kvrcoin"] == 3.0
+
+
+def test_added_column_appears_in_public_responses(client, db):
+    db.execute("ALTER TABLE users ADD COLUMN rating REAL NOT NULL DEFAULT 1")
+    created = client.post("/users", json={"username": "alice", "pin": "1234"}, headers=HEADERS)
+    assert created.get_json()["rating"] == 1.0
+    updated = client.patch("/users/alice", json={"kvrcoin": 3}, headers=HEADERS)
+    resp = client.get("/users/alice", headers=HEADERS)
+    assert updated.data == resp.data
+    assert "id" not in resp.get_json()
+
+
+def test_get_user_sets_cache_headers_and_honors_etag(client, db):
+    seed_user(db, "alice", 1234)
+    resp = client.get("/users/alice", headers=HEADERS)
+    etag = resp.headers["ETag"]
+    assert etag.startswith('W/"')
+    assert resp.headers["Cache-Control"] == "private, max-age=2"
+    resp = client.get("/users/alice", headers={**HEADERS, "If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+
 # ---------------------------------------------------------------------------
 # Get by PIN
 # ---------------------------------------------------------------------------
 
-def test_get_user_by_pin(client):
-    client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
+def test_get_user_by_pin(client, db):
+    seed_user(db, "alice", 1234)
     resp = client.get("/users/pin/1234", headers=HEADERS)
     assert resp.status_code == 200
     assert resp.get_json()["username"] == "alice"
@@ -128,12 +255,40 @@ def test_get_nonexistent_pin_returns_404(client):
     assert resp.status_code == 404
 
 
+# ---------------------------------------------------------------------------
+# Chess leaderboard
+# ---------------------------------------------------------------------------
+
+def test_chess_leaderboard(client, db):
+    seed_user(db, "alice", 1234, chess_points=5)
+    seed_user(db, "bob", 5678, chess_points=9)
+    resp = client.get("/leaderboard/chess", headers=HEADERS)
+    assert resp.status_code == 200
+    assert resp.get_json() == [
+        {"username": "bob", "chess_points": 9},
+        {"username": "alice", "chess_points": 5},
+    ]
+
+
+def test_chess_leaderboard_ndjson(client, db):
+    seed_user(db, "alice", 1234, chess_points=5)
+    seed_user(db, "bob", 5678, chess_points=9)
+    resp = client.get(
+        "/leaderboard/chess?order=asc&limit=1",
+        headers={**HEADERS, "Accept": "application/x-ndjson"},
+    )
+    assert resp.status_code == 200
+    assert resp.mimetype == "application/x-ndjson"
+    lines = resp.get_data(as_text=True).splitlines()
+    assert [json.loads(line) for line in lines] == [{"username": "alice", "chess_points": 5}]
+
+
 # ---------------------------------------------------------------------------
 # Update user
 # ---------------------------------------------------------------------------
 
-def test_update_user(client):
-    client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
+def test_update_user(client, db):
+    seed_user(db, "alice", 1234)
     resp = client.patch(
         "/users/alice",
         json={"kvrcoin": 500, "chess_points": 10},
@@ -145,6 +300,26 @@ def test_update_user(client):
     assert data["chess_points"] == 10
 
 
+def test_update_user_binds_values_to_matching_fields(client, db):
+    seed_user(db, "alice", "1234")
+    resp = client.patch(
+        "/users/alice",
+        json={"pin": "4321", "kvrcoin": 7, "chess_points": 3},
+        headers=HEADERS,
+    )
+    assert resp.status_code == 200
+    data = resp.get_json()
+    assert data["pin"] == "4321"
+    assert data["kvrcoin"] == 7
+    assert data["chess_points"] == 3
+
+
+def test_update_sql_binds_in_sorted_field_order():
+    for fields, sql in server.UPDATE_SQL.items():
+        assert fields == tuple(sorted(fields))
+        assert sql == server.update_sql(fields)
+
+
 def test_update_nonexistent_user_returns_404(client):
     resp = client.patch(
         "/users/nobody", json={"kvrcoin": 10}, headers=HEADERS
@@ -152,8 +327,8 @@ def test_update_nonexistent_user_returns_404(client):
     assert resp.status_code == 404
 
 
-def test_update_with_no_valid_fields_returns_400(client):
-    client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
+def test_update_with_no_valid_fields_returns_400(client, db):
+    seed_user(db, "alice", 1234)
     resp = client.patch("/users/alice", json={"id": 99}, headers=HEADERS)
     assert resp.status_code == 400
 
@@ -162,14 +337,154 @@ def test_update_with_no_valid_fields_returns_400(client):
 # Delete user
 # ---------------------------------------------------------------------------
 
-def test_delete_user(client):
-    client.post("/users", json={"username": "alice", "pin": 1234}, headers=HEADERS)
+def test_delete_user(client, db):
+    seed_user(db, "alice", 1234)
     resp = client.delete("/users/alice", headers=HEADERS)
     assert resp.status_code == 200
     # Confirm gone
-    assert client.get("/users/alice", headers=HEADERS).status_code == 404
+    assert db.execute("SELECT 1 FROM users WHERE username = ?", ("alice",)).fetchone() is None
 
 
 def test_delete_nonexistent_user_returns_404(client):
     resp = client.delete("/users/nobody", headers=HEADERS)
     assert resp.status_code == 404
+
+
+# ---------------------------------------------------------------------------
+# Admin UI
+# ---------------------------------------------------------------------------
+
+def test_admin_index_sets_cache_headers_and_honors_etag():
+    admin = Client(server.make_application(admin_enabled=True))
+    resp = admin.get("/admin/")
+    assert resp.status_code == 200
+    assert resp.mimetype == "text/html"
+    assert resp.headers["Cache-Control"] == "public, max-age=3600"
+    etag = resp.headers["ETag"]
+    assert etag == f'"{server._ADMIN_ETAG}"'
+    resp = admin.get("/admin/", headers={"If-None-Match": etag})
+    assert resp.status_code == 304
+    assert resp.data == b""
+
+
+def test_admin_is_not_mounted_by_default():
+    assert server.make_application(admin_enabled=False) is app
+    resp = Client(server.make_application(admin_enabled=False)).post("/admin/api/admin/set", json={"password": "x" * 8})
+    assert resp.status_code == 401
+
+
+def test_admin_mount_redirects_to_trailing_slash():
+    resp = Client(server.make_application(admin_enabled=True)).get("/admin")
+    assert resp.status_code == 308
+    assert resp.headers["Location"].endswith("/admin/")
+
+
+def test_admin_api_is_served_without_api_key(admin_client, db):
+    seed_user(db, "alice", 1234)
+    status = admin_client.get("/admin/api/admin/status")
+    assert status.status_code == 200
+    assert status.get_json() == {"has_password": True}
+    resp = admin_client.get("/admin/api/users", auth=ADMIN_AUTH)
+    assert resp.status_code == 200
+    assert [u["username"] for u in resp.get_json()] == ["alice"]
+    # The public API mounted beside it still requires the key
+    assert admin_client.get("/users/alice").status_code == 401
+
+
+# ---------------------------------------------------------------------------
+# Admin batch create
+# ---------------------------------------------------------------------------
+
+def test_admin_create_users_batch(admin_client):
+    resp = admin_client.post(
+        "/admin/api/users",
+        json=[{"username": "alice", "pin": "1234"}, {"username": "bob", "pin": "5678", "kvrcoin": 3}],
+        auth=ADMIN_AUTH,
+    )
+    assert resp.status_code == 201
+    assert [(u["username"], u["kvrcoin"]) for u in resp.get_json()] == [("alice", 0), ("bob", 3)]
+
+
+def test_admin_create_users_batch_keeps_submission_order(admin_client):
+    resp = admin_client.post(
+        "/admin/api/users",
+        json=[
+            {"username": "alice", "pin": "1234", "kvrcoin": 1},
+            {"username": "bob", "pin": "5678"},
+            {"username": "carol", "pin": "4321", "kvrcoin": 2},
+        ],
+        auth=ADMIN_AUTH,
+    )
+    assert resp.status_code == 201
+    users = resp.get_json()
+    assert [u["username"] for u in users] == ["alice", "bob", "carol"]
+    assert [u["id"] for u in users] == sorted(u["id"] for u in users)
+
+
+def test_admin_create_users_batch_conflict_writes_nothing(admin_client, db):
+    seed_user(db, "alice", 1234)
+    resp = admin_client.post(
+        "/admin/api/users",
+        json=[{"username": "bob", "pin": "5678"}, {"username": "alice", "pin": "9999"}, {"username": "carol", "pin": "4321"}],
+        auth=ADMIN_AUTH,
+    )
+    assert resp.status_code == 409
+    assert [r[0] for r in db.execute("SELECT username FROM users")] == ["alice"]
+
+
+def test_admin_create_users_batch_rejects_non_object(admin_client, db):
+    resp = admin_client.post(
+        "/admin/api/users",
+        json=[{"username": "bob", "pin": "5678"}, "carol"],
+        auth=ADMIN_AUTH,
+    )
+    assert resp.status_code == 400
+    assert db.execute("SELECT 1 FROM users").fetchone() is None
+
+
+# ---------------------------------------------------------------------------
+# Connection pool
+# ---------------------------------------------------------------------------
+
+def test_pool_write_is_visible_to_another_connection(pool_db):
+    with server.get_db() as writer, server.get_db() as reader:
+        assert writer is not reader
+        writer.execute(SEED_USER, ("alice", "1234", 0, 0))
+        assert reader.execute("SELECT pin FROM users WHERE username = ?", ("alice",)).fetchone()[0] == "1234"
+        assert reader.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        assert reader.execute("PRAGMA foreign_keys").fetchone()[0] == 1
+
+
+def test_pool_rolls_back_transaction_left_open(pool_db):
+    with server.get_db() as conn:
+        conn.execute("BEGIN")
+        seed_user(conn, "alice", 1234)
+    with server.get_db() as again:
+        assert again is conn
+        assert not again.in_transaction
+        assert again.execute("SELECT 1 FROM users").fetchone() is None
+
+
+def test_close_ignores_failed_optimize():
+    class Conn:
+        closed = False
+
+        def execute(self, sql):
+            raise sqlite3.OperationalError("database is locked")
+
+        def close(self):
+            self.closed = True
+
+    conn = Conn()
+    server._close(conn)
+    assert conn.closed
+
+
+def test_pool_reconnects_when_database_changes(pool_db, tmp_path, monkeypatch):
+    with server.get_db() as old:
+        pass
+    other = str(tmp_path / "other.db")
+    monkeypatch.setitem(app.config, "DATABASE", other)
+    with server.get_db() as conn:
+        assert conn is not old
+        assert conn.execute("PRAGMA database_list").fetchone()[2] == other